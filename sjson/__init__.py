@@ -3,128 +3,16 @@
 # @license: 3-clause BSD
 
 import collections.abc
-from abc import abstractmethod
 import collections
+import functools
 import numbers
-import string
+import re
 import io
-from enum import Enum
+import sys
 import typing
+import weakref
 
-__version__ = '2.2.0'
-
-
-class _InputStream:
-    @abstractmethod
-    def read(self, count: int = 1) -> bytes: ...
-
-    @abstractmethod
-    def skip(self, count: int = 1): ...
-
-    @abstractmethod
-    def peek(self, count: int = 1, allow_end_of_stream=False) -> bytes | None:
-        pass
-
-    @abstractmethod
-    def get_location(self) -> tuple[int, int]: ...
-
-
-class MemoryInputStream(_InputStream):
-    """Input stream wrapper for reading directly from memory."""
-
-    def __init__(self, s: bytes):
-        """
-        s -- a bytes object.
-        """
-        self._stream = s
-        self._current_index = 0
-        self._length = len(s)
-
-    def read(self, count=1) -> bytes:
-        """read ``count`` bytes from the stream."""
-        end_index = self._current_index + count
-        if end_index > self._length:
-            _raise_end_of_stream_exception(self)
-        result = self._stream[self._current_index : end_index]
-        self._current_index = end_index
-        return result
-
-    def peek(self, count=1, allow_end_of_stream=False) -> bytes | None:
-        """peek ``count`` bytes from the stream. If ``allow_end_of_stream`` is
-        ``True``, no error will be raised if the end of the stream is reached
-        while trying to peek."""
-        end_index = self._current_index + count
-        if end_index > self._length:
-            if allow_end_of_stream:
-                return None
-            _raise_end_of_stream_exception(self)
-
-        return self._stream[self._current_index : end_index]
-
-    def skip(self, count=1):
-        """skip ``count`` bytes."""
-        self._current_index += count
-
-    def get_location(self) -> tuple[int, int]:
-        """Get the current location in the stream."""
-        loc = collections.namedtuple('loc', ['line', 'column'])
-        bytes_read = self._stream[: self._current_index]
-        line = 1
-        column = 1
-        for byte in bytes_read:
-            # We test the individual bytes here, must use ord
-            if byte == ord('\n'):
-                line += 1
-                column = 1
-            else:
-                column += 1
-        return loc(line, column)
-
-
-class ByteBufferInputStream(_InputStream):
-    """Input stream wrapper for reading directly from an I/O object."""
-
-    def __init__(self, stream: io.BufferedReader):
-        self._stream = stream
-        self._index = 0
-        self._line = 1
-        self._column = 1
-
-    def read(self, count=1) -> bytes:
-        """read ``count`` bytes from the stream."""
-        result = self._stream.read(count)
-        if len(result) < count:
-            _raise_end_of_stream_exception(self)
-
-        for char in result:
-            # We test the individual bytes here, must use ord
-            if char == ord('\n'):
-                self._line += 1
-                self._column = 1
-            else:
-                self._column += 1
-        return result
-
-    def peek(self, count=1, allow_end_of_stream=False) -> bytes | None:
-        """peek ``count`` bytes from the stream. If ``allow_end_of_stream`` is
-        ``True``, no error will be raised if the end of the stream is reached
-        while trying to peek."""
-        result = self._stream.peek(count)
-        if not result and not allow_end_of_stream:
-            _raise_end_of_stream_exception(self)
-        elif not result and allow_end_of_stream:
-            return None
-
-        return result[:count]
-
-    def skip(self, count=1):
-        """skip ``count`` bytes."""
-        self.read(count)
-
-    def get_location(self) -> tuple[int, int]:
-        """Get the current location in the stream."""
-        loc = collections.namedtuple('loc', ['line', 'column'])
-        return loc(self._line, self._column)
+__version__ = '3.0.0'
 
 
 class ParseException(RuntimeError):
@@ -145,334 +33,325 @@ class ParseException(RuntimeError):
         )
 
 
-def _raise_end_of_stream_exception(stream: _InputStream) -> typing.NoReturn:
-    raise ParseException('Unexpected end-of-stream', stream.get_location())
+# The parser works directly on the UTF-8 encoded input. All _decode/_parse
+# functions take the input buffer and the current position, and return the
+# decoded value together with the position after it. Line and column are only
+# computed from the position when an error is reported.
 
 
-def _consume(stream: _InputStream, what: bytes):
-    _skip_whitespace(stream)
-    what_len = len(what)
-    if stream.peek(what_len) != what:
-        raise ParseException(
-            "Expected to read '{}'".format(what.decode('utf-8')), stream.get_location()
-        )
-    stream.skip(what_len)
+_Location = collections.namedtuple('loc', ['line', 'column'])
 
 
-def _skip_characters_and_whitespace(stream: _InputStream, num_char_to_skip: int):
-    stream.skip(num_char_to_skip)
-    return _skip_whitespace(stream)
+def _get_location(buf: bytes, pos: int) -> tuple[int, int]:
+    """Get the line and column of ``pos`` within ``buf``."""
+    line = buf.count(b'\n', 0, pos) + 1
+    # rfind returns -1 if there is no newline, which makes the first column 1
+    column = pos - buf.rfind(b'\n', 0, pos)
+    return _Location(line, column)
 
 
-# Frozenset of b' \t\n\r' yields a frozen set of integers, but we want a
-# frozen set of bytes so we need to enumerate them here
-_WHITESPACE_SET = frozenset([b' ', b'\t', b'\n', b'\r'])
+def _raise_end_of_stream_exception(buf: bytes, pos: int) -> typing.NoReturn:
+    raise ParseException('Unexpected end-of-stream', _get_location(buf, pos))
 
 
-def _is_whitespace(char: bytes | None):
-    return char in _WHITESPACE_SET
+def _consume(buf: bytes, pos: int, what: bytes) -> int:
+    """Consume ``what``, which must be at ``pos``. Callers are expected to have
+    skipped whitespace already."""
+    end = pos + len(what)
+    if end > len(buf):
+        _raise_end_of_stream_exception(buf, pos)
+    if not buf.startswith(what, pos):
+        raise ParseException(
+            "Expected to read '{}'".format(what.decode('utf-8')),
+            _get_location(buf, pos),
+        )
+    return end
+
+
+# Byte values of the structural characters. Indexing the buffer yields ints,
+# which compare faster than one-byte slices
+_QUOTE = ord('"')
+_COMMA = ord(',')
+_COLON = ord(':')
+_EQUALS = ord('=')
+_OPEN_BRACKET = ord('[')
+_CLOSE_BRACKET = ord(']')
+_OPEN_BRACE = ord('{')
+_CLOSE_BRACE = ord('}')
+
+# Skips whitespace together with C and C++ style comments in a single match
+_WHITESPACE_PATTERN = re.compile(
+    rb'[ \t\n\r]*(?:(?://[^\n]*|/\*.*?\*/)[ \t\n\r]*)*', re.DOTALL
+)
+
+
+def _skip_whitespace(buf: bytes, pos: int) -> int:
+    """skip whitespace and comments. Returns the position of the next
+    character, which is ``len(buf)`` if the end of the input was hit."""
+    pos = _WHITESPACE_PATTERN.match(buf, pos).end()
+    # The pattern can only stop at the start of a C style comment if the
+    # comment is never closed. We don't support nested comments, so this is
+    # the only error we can encounter here
+    if buf.startswith(b'/*', pos):
+        raise ParseException(
+            "Could not find closing '*/' for comment", _get_location(buf, pos)
+        )
+    return pos
 
 
-def _skip_c_style_comment(stream: _InputStream):
-    comment_start_location = stream.get_location()
-    # skip the comment start
-    stream.skip(2)
-    # we don't support nested comments, so we're not going to
-    # count the nesting level. Instead, skip ahead until we
-    # find a closing */
-    while True:
-        next_char = stream.peek(1, allow_end_of_stream=True)
-        if next_char == b'*':
-            comment_end = stream.peek(2, allow_end_of_stream=True)
-            if comment_end == b'*/':
-                stream.skip(2)
-                break
-            else:
-                stream.skip()
-        elif next_char is None:
-            raise ParseException(
-                "Could not find closing '*/' for comment", comment_start_location
-            )
-        stream.skip()
-
-
-def _skip_cpp_style_comment(stream: _InputStream):
-    # skip the comment start
-    stream.skip(2)
-    while True:
-        next_char = stream.peek(allow_end_of_stream=True)
-        if next_char is None or next_char == b'\n':
-            break
-        stream.skip()
+def _skip_whitespace_and_separator(buf: bytes, pos: int) -> int:
+    """skip whitespace and an optional ``,`` separator between elements."""
+    pos = _skip_whitespace(buf, pos)
+    if pos != len(buf) and buf[pos] == _COMMA:
+        pos = _skip_whitespace(buf, pos + 1)
+    return pos
 
 
-def _skip_whitespace(stream: _InputStream):
-    """skip whitespace. Returns the next character if a new position within the
-    stream was found; returns None if the end of the stream was hit."""
-    while True:
-        next_char = stream.peek(allow_end_of_stream=True)
-        if not _is_whitespace(next_char):
-            if next_char == b'/':
-                # this could be a C or C++ style comment
-                comment_start = stream.peek(2, allow_end_of_stream=True)
-                if comment_start == b'/*':
-                    _skip_c_style_comment(stream)
-                    continue
-                elif comment_start == b'//':
-                    _skip_cpp_style_comment(stream)
-                    continue
-            break
-        stream.skip()
+_IDENTIFIER_PATTERN = re.compile(rb'[A-Za-z0-9_]*')
 
-    return next_char
+# Matches any character which is not allowed inside an identifier, used to
+# decide whether a string must be quoted when encoding
+_NON_IDENTIFIER_PATTERN = re.compile(r'[^A-Za-z0-9_]')
 
+# Run of bytes inside a " delimited string which can be copied verbatim
+_STRING_RUN_PATTERN = re.compile(rb'[^"\\]*')
 
-_IDENTIFIER_SET = frozenset(string.ascii_letters + string.digits + '_')
+_ESCAPED_CHARACTER_MAP = {
+    b'b': b'\b',
+    b'n': b'\n',
+    b't': b'\t',
+    b'\\': b'\\',
+    b'"': b'"',
+}
 
 
-def _is_identifier(obj: bytes):
-    return chr(obj[0]) in _IDENTIFIER_SET
+def _decode_identifier(buf: bytes, pos: int) -> tuple[str, int]:
+    end = _IDENTIFIER_PATTERN.match(buf, pos).end()
+    # An identifier is always followed by a value, so we must not be at the
+    # end of the input yet
+    if end == len(buf):
+        _raise_end_of_stream_exception(buf, end)
+    # Identifiers only consist of ASCII characters
+    return buf[pos:end].decode('ascii'), end
 
 
-def _decode_escaped_character(char: bytes):
-    match char:
-        case b'b':
-            return b'\b'
-        case b'n':
-            return b'\n'
-        case b't':
-            return b'\t'
-        case b'\\' | b'"':
-            return char
-        case _:
-            # If we get here, it's an invalid escape sequence. We will simply
-            # return it as-if it was not invalid (i.e. \l for instance will get
-            # turned into \\l)
-            return b'\\' + char
+def _decode_quoted_string(buf: bytes, pos: int) -> tuple[str, int]:
+    """Decode a " delimited string. ``pos`` is the position after the opening
+    quote."""
+    end = buf.find(b'"', pos)
+    if end == -1:
+        _raise_end_of_stream_exception(buf, len(buf))
+    if buf.find(b'\\', pos, end) == -1:
+        # Most strings don't contain any escapes, in which case the whole
+        # string can be decoded directly
+        return buf[pos:end].decode('utf-8'), end + 1
 
-
-class RawQuoteStyle(Enum):
-    Lua = 1
-    Python = 2
-
-
-def _decode_string(stream: _InputStream, allow_identifier=False):
+    result = bytearray()
+    while True:
+        run_end = _STRING_RUN_PATTERN.match(buf, pos).end()
+        result += buf[pos:run_end]
+        # The run stops either at the closing quote or at an escape
+        if run_end == len(buf):
+            _raise_end_of_stream_exception(buf, run_end)
+        if buf[run_end] == _QUOTE:
+            return result.decode('utf-8'), run_end + 1
+        escaped_char = buf[run_end + 1 : run_end + 2]
+        if not escaped_char:
+            _raise_end_of_stream_exception(buf, len(buf))
+        # An invalid escape sequence is passed through as-if it was not
+        # escaped (i.e. \l for instance will get turned into \\l)
+        result += _ESCAPED_CHARACTER_MAP.get(escaped_char) or (
+            b'\\' + escaped_char
+        )
+        pos = run_end + 2
+
+
+def _decode_python_raw_string(buf: bytes, pos: int) -> tuple[str, int]:
+    """Decode a \"\"\" delimited string. ``pos`` is the position after the
+    opening quotes."""
+    end = buf.find(b'"""', pos)
+    if end == -1:
+        _raise_end_of_stream_exception(buf, len(buf))
+    # This is a tricky case -- we're in a """ quoted string, and
+    # we spotted three consecutive """. This could mean we're at the
+    # end, but it doesn't have to be -- we actually need to check
+    # all the cases below:
+    #   * """: simple case, just end here
+    #   * """": A single quote inside the string,
+    #     followed by the end marker
+    #   * """"": A double double quote inside the string,
+    #     followed by the end marker
+    # Note that """""" is invalid, no matter what follows
+    # afterwards, as the first group of three terminates the string,
+    # and then we'd have an unrelated string afterwards. We don't
+    # concat strings automatically so this will trigger an error
+    # Start with longest match, as the other is prefix this has
+    # to be the first check
+    if buf.startswith(b'"""""', end):
+        end += 2
+    elif buf.startswith(b'""""', end):
+        end += 1
+    return buf[pos:end].decode('utf-8'), end + 3
+
+
+def _decode_lua_raw_string(buf: bytes, pos: int) -> tuple[str, int]:
+    """Decode a [=[ delimited string. ``pos`` is the position after the
+    opening delimiter."""
+    end = buf.find(b']=]', pos)
+    if end == -1:
+        _raise_end_of_stream_exception(buf, len(buf))
+    return buf[pos:end].decode('utf-8'), end + 3
+
+
+def _decode_string(
+    buf: bytes, pos: int, allow_identifier=False
+) -> tuple[str, int]:
     # When we enter here, we either start with " or [, or there is no quoting
     # enabled.
-    _skip_whitespace(stream)
-
-    result = bytearray()
-
-    is_quoted = stream.peek() == b'"' or stream.peek() == b'['
-    if not allow_identifier and not is_quoted:
-        raise ParseException('Quoted string expected', stream.get_location())
+    if pos == len(buf):
+        _raise_end_of_stream_exception(buf, pos)
 
-    raw_quotes = None
+    head = buf[pos : pos + 3]
     # Try Python-style, """ delimited strings
-    if is_quoted and stream.peek(3) == b'"""':
-        stream.skip(3)
-        raw_quotes = RawQuoteStyle.Python
+    if head == b'"""':
+        return _decode_python_raw_string(buf, pos + 3)
     # Try Lua-style, [=[ delimited strings
-    elif is_quoted and stream.peek(3) == b'[=[':
-        stream.skip(3)
-        raw_quotes = RawQuoteStyle.Lua
-    elif is_quoted and stream.peek() == b'"':
-        stream.skip()
-    elif is_quoted:
-        #
+    elif head == b'[=[':
+        return _decode_lua_raw_string(buf, pos + 3)
+
+    first_char = buf[pos]
+    if first_char == _QUOTE:
+        return _decode_quoted_string(buf, pos + 1)
+    elif first_char == _OPEN_BRACKET:
         raise ParseException(
             'Invalid quoted string, must start with ",' '""", or [=[',
-            stream.get_location(),
+            _get_location(buf, pos),
         )
+    elif not allow_identifier:
+        raise ParseException('Quoted string expected', _get_location(buf, pos))
 
-    parse_as_identifier = not is_quoted
+    return _decode_identifier(buf, pos)
 
-    while True:
-        next_char = stream.peek()
 
-        # peek() cannot return None here as we don't allow peeking beyond the
-        # end of the file
-        assert next_char is not None
+# A number extends up to the next whitespace or container delimiter. The group
+# matches if the number contains a decimal point or an exponent, in which case
+# it must be parsed as a float
+_NUMBER_PATTERN = re.compile(rb'[^ \t\n\r,\]}.eE]*([.eE])?[^ \t\n\r,\]}]*')
 
-        if parse_as_identifier and not _is_identifier(next_char):
-            break
-
-        if raw_quotes:
-            if (
-                raw_quotes == RawQuoteStyle.Python
-                and next_char == b'"'
-                and stream.peek(3) == b'"""'
-            ):
-                # This is a tricky case -- we're in a """ quoted string, and
-                # we spotted three consecutive """. This could mean we're at the
-                # end, but it doesn't have to be -- we actually need to check
-                # all the cases below:
-                #   * """: simple case, just end here
-                #   * """": A single quote inside the string,
-                #     followed by the end marker
-                #   * """"": A double double quote inside the string,
-                #     followed by the end marker
-                # Note that """""" is invalid, no matter what follows
-                # afterwards, as the first group of three terminates the string,
-                # and then we'd have an unrelated string afterwards. We don't
-                # concat strings automatically so this will trigger an error
-                # Start with longest match, as the other is prefix this has
-                # to be the first check
-                if stream.peek(5, allow_end_of_stream=True) == b'"""""':
-                    result += b'""'
-                    stream.skip(5)
-                    break
-                elif stream.peek(4, allow_end_of_stream=True) == b'""""':
-                    result += next_char
-                    stream.skip(4)
-                    break
-                stream.skip(3)
-                break
-            elif (
-                raw_quotes == RawQuoteStyle.Lua
-                and next_char == b']'
-                and stream.peek(3) == b']=]'
-            ):
-                stream.skip(3)
-                break
-            else:
-                assert next_char is not None
-                result += next_char
-                stream.skip(1)
-        else:
-            if next_char == b'"':
-                stream.read()
-                break
-            elif next_char == b'\\':
-                stream.skip()
-                result += _decode_escaped_character(stream.read())
-            else:
-                assert next_char is not None
-                result += next_char
-                stream.skip()
 
-    return str(result, encoding='utf-8')
+def _decode_number(buf: bytes, pos: int) -> tuple[int | float, int]:
+    """Parse a number."""
+    match = _NUMBER_PATTERN.match(buf, pos)
+    end = match.end()
 
+    if match.lastindex:
+        return float(buf[pos:end]), end
+    return int(buf[pos:end]), end
 
-_NUMBER_SEPARATOR_SET = _WHITESPACE_SET.union({b',', b']', b'}', None})
 
+def _decode_dict(buf: bytes, pos: int, delimited=False) -> tuple[dict, int]:
+    """
+    delimited -- if ``True``, parsing will stop once the end-of-dictionary
+                 delimiter has been reached(``}``)
+    """
+    result = {}
+    length = len(buf)
 
-def _decode_number(stream: _InputStream, next_char):
-    """Parse a number.
+    if pos != length and buf[pos] == _OPEN_BRACE:
+        pos += 1
 
-    next_char -- the next byte in the stream.
-    """
-    number_bytes = bytearray()
-    is_decimal_number = False
+    pos = _skip_whitespace(buf, pos)
 
     while True:
-        if next_char in _NUMBER_SEPARATOR_SET:
+        if pos == length:
+            if not delimited:
+                break
+            _raise_end_of_stream_exception(buf, pos)
+
+        if buf[pos] == _CLOSE_BRACE:
+            pos += 1
             break
 
-        if next_char == b'.' or next_char == b'e' or next_char == b'E':
-            is_decimal_number = True
+        key, pos = _decode_string(buf, pos, True)
+        pos = _skip_whitespace(buf, pos)
+        # We allow both '=' and ':' as separators inside maps
+        if pos != length and buf[pos] in (_EQUALS, _COLON):
+            pos += 1
+        value, pos = _parse(buf, pos)
+        # Keys tend to repeat across a document, interning them makes all
+        # occurrences share one string object
+        result[sys.intern(key)] = value
 
-        number_bytes += next_char
-        stream.skip()
+        pos = _skip_whitespace_and_separator(buf, pos)
 
-        next_char = stream.peek(allow_end_of_stream=True)
+    return result, pos
 
-    value = number_bytes.decode('utf-8')
 
-    if is_decimal_number:
-        return float(value)
-    return int(value)
+def _parse_list(buf: bytes, pos: int) -> tuple[list, int]:
+    result = []
+    length = len(buf)
+    # skip '['
+    pos = _skip_whitespace(buf, pos + 1)
 
+    while True:
+        if pos != length and buf[pos] == _CLOSE_BRACKET:
+            pos += 1
+            break
 
-def _decode_dict(stream: _InputStream, delimited=False):
-    """
-    delimited -- if ``True``, parsing will stop once the end-of-dictionary
-                 delimiter has been reached(``}``)
-    """
-    from collections import OrderedDict
+        value, pos = _parse(buf, pos)
+        result.append(value)
 
-    result = OrderedDict()
+        pos = _skip_whitespace_and_separator(buf, pos)
 
-    if stream.peek() == b'{':
-        stream.skip()
+    return result, pos
 
-    next_char = _skip_whitespace(stream)
 
-    while True:
-        if not delimited and next_char is None:
-            break
+def _parse_true(buf: bytes, pos: int) -> tuple[bool, int]:
+    return True, _consume(buf, pos, b'true')
 
-        if next_char == b'}':
-            stream.skip()
-            break
 
-        key = _decode_string(stream, True)
-        next_char = _skip_whitespace(stream)
-        # We allow both '=' and ':' as separators inside maps
-        if next_char == b'=' or next_char == b':':
-            _consume(stream, next_char)
-        value = _parse(stream)
-        result[key] = value
+def _parse_false(buf: bytes, pos: int) -> tuple[bool, int]:
+    return False, _consume(buf, pos, b'false')
 
-        next_char = _skip_whitespace(stream)
-        if next_char == b',':
-            next_char = _skip_characters_and_whitespace(stream, 1)
 
-    return result
+def _parse_null(buf: bytes, pos: int) -> tuple[None, int]:
+    return None, _consume(buf, pos, b'null')
 
 
-def _parse_list(stream: _InputStream):
-    result = []
-    # skip '['
-    next_char = _skip_characters_and_whitespace(stream, 1)
+def _parse_dict(buf: bytes, pos: int) -> tuple[dict, int]:
+    return _decode_dict(buf, pos, True)
 
-    while True:
-        if next_char == b']':
-            stream.skip()
-            break
 
-        value = _parse(stream)
-        result.append(value)
+def _parse_list_or_raw_string(buf: bytes, pos: int):
+    # second lookup character for [=[]=] raw literal strings
+    if pos + 1 != len(buf) and buf[pos + 1] == _EQUALS:
+        return _decode_string(buf, pos)
+    return _parse_list(buf, pos)
 
-        next_char = _skip_whitespace(stream)
-        if next_char == b',':
-            next_char = _skip_characters_and_whitespace(stream, 1)
-
-    return result
-
-
-def _parse(stream: _InputStream):
-    next_char = _skip_whitespace(stream)
-
-    match next_char:
-        case b't':
-            _consume(stream, b'true')
-            return True
-        case b'f':
-            _consume(stream, b'false')
-            return False
-        case b'n':
-            _consume(stream, b'null')
-            return None
-        case b'{':
-            return _decode_dict(stream, True)
-        case b'"':
-            return _decode_string(stream)
-        case b'[':
-            peek = stream.peek(2, allow_end_of_stream=False)
-            # second lookup character for [=[]=] raw literal strings
-            assert peek is not None
-            assert len(peek) == 2
-            next_char_2 = peek[1:2]
-            if next_char_2 != b'=':
-                return _parse_list(stream)
-            elif next_char_2 == b'=':
-                return _decode_string(stream)
 
+def _parse_number(buf: bytes, pos: int) -> tuple[int | float, int]:
     try:
-        return _decode_number(stream, next_char)
+        return _decode_number(buf, pos)
     except ValueError:
-        raise ParseException('Invalid character', stream.get_location())
+        raise ParseException('Invalid character', _get_location(buf, pos))
+
+
+# Maps the first byte of a value to the function parsing it. Everything not
+# listed here is parsed as a number
+_PARSE_DISPATCH = [_parse_number] * 256
+_PARSE_DISPATCH[ord('t')] = _parse_true
+_PARSE_DISPATCH[ord('f')] = _parse_false
+_PARSE_DISPATCH[ord('n')] = _parse_null
+_PARSE_DISPATCH[ord('{')] = _parse_dict
+_PARSE_DISPATCH[ord('"')] = _decode_string
+_PARSE_DISPATCH[ord('[')] = _parse_list_or_raw_string
+
+
+def _parse(buf: bytes, pos: int):
+    pos = _skip_whitespace(buf, pos)
+    if pos == len(buf):
+        _raise_end_of_stream_exception(buf, pos)
+    return _PARSE_DISPATCH[buf[pos]](buf, pos)
 
 
 def load(stream: io.RawIOBase):
@@ -480,27 +359,16 @@ def load(stream: io.RawIOBase):
 
     The stream is assumed to point to UTF-8 encoded data.
     """
-    return _decode_dict(ByteBufferInputStream(io.BufferedReader(stream)))
+    return _decode_dict(stream.read(), 0)[0]
 
 
 def loads(text: str):
     """Load a SJSON object from a string."""
-    return _decode_dict(MemoryInputStream(text.encode('utf-8')))
+    return _decode_dict(text.encode('utf-8'), 0)[0]
 
 
-def dumps(obj, indent=None) -> str:
+def dumps(obj, indent: int | None | str = None) -> str:
     """Dump an object to a string."""
-    import io
-
-    stream = io.StringIO()
-    dump(obj, stream, indent)
-    return stream.getvalue()
-
-
-def dump(obj, fp: io.TextIOBase, indent: int | None | str = None):
-    """Dump an object to a text stream.
-
-    The output is always text, not binary."""
     if not indent:
         _indent = ''
     elif isinstance(indent, int):
@@ -510,33 +378,44 @@ def dump(obj, fp: io.TextIOBase, indent: int | None | str = None):
     else:
         _indent = indent
 
-    for e in _encode(obj, indent=_indent):
-        fp.write(e)
+    out: list[str] = []
+    _encode(obj, out, indent=_indent)
+    return ''.join(out)
 
 
-_ESCAPE_CHARACTER_SET = {'\n': '\\n', '\b': '\\b', '\t': '\\t', '"': '\\"'}
+def dump(obj, fp: io.TextIOBase, indent: int | None | str = None):
+    """Dump an object to a text stream.
 
+    The output is always text, not binary."""
+    fp.write(dumps(obj, indent))
 
-def _escape_string(obj: str, quote=True) -> typing.Generator[str, None, None]:
+
+# Backslashes must be escaped as well, otherwise a literal backslash followed
+# by n, t, ... would be read back as an escape sequence
+_ESCAPE_TABLE = str.maketrans(
+    {'\n': '\\n', '\b': '\\b', '\t': '\\t', '"': '\\"', '\\': '\\\\'}
+)
+
+
+def _escape_string(obj: str, quote=True) -> str:
     """Escape a string.
 
     If quote is set, the string will be returned with quotation marks at the
     beginning and end. If quote is set to false, quotation marks will be only
     added if needed(that is, if the string is not an identifier.)"""
-    if any([c not in _IDENTIFIER_SET for c in obj]):
+    if _NON_IDENTIFIER_PATTERN.search(obj):
         # String must be quoted, even if quote was not requested
         quote = True
 
-    if quote:
-        yield '"'
+    obj = obj.translate(_ESCAPE_TABLE)
 
-    for key, value in _ESCAPE_CHARACTER_SET.items():
-        obj = obj.replace(key, value)
+    if quote:
+        return '"' + obj + '"'
+    return obj
 
-    yield obj
 
-    if quote:
-        yield '"'
+# Small integers are very common in configuration files (sizes, flags, ...)
+_INT_STRINGS = {i: str(i) for i in range(-128, 1024)}
 
 
 _SUPPORTED_ENCODE_TYPE: typing.TypeAlias = typing.Union[
@@ -551,73 +430,166 @@ _SUPPORTED_ENCODE_TYPE: typing.TypeAlias = typing.Union[
 
 def _encode(
     obj: _SUPPORTED_ENCODE_TYPE,
+    out: list[str],
     separators: tuple[str, str, str] = (', ', '\n', ' = '),
     indent: str = '',
     level: int = 0,
 ):
+    encoder = _ENCODERS.get(type(obj))
+    if encoder is None:
+        encoder = _RESOLVED_ENCODERS.get(type(obj))
+        if encoder is None:
+            encoder = _find_encoder(obj)
+            # Remember the result, so further instances of the same type skip
+            # the (slow) abstract base class checks
+            _RESOLVED_ENCODERS[type(obj)] = encoder
+    encoder(obj, out, separators, indent, level)
+
+
+# Encoders found by _find_encoder, by type. Types are held weakly, so classes
+# which are created on the fly can still be collected
+_RESOLVED_ENCODERS: weakref.WeakKeyDictionary[type, typing.Callable] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _find_encoder(obj: _SUPPORTED_ENCODE_TYPE):
+    """Find the encoder for types which are not in ``_ENCODERS``, i.e.
+    subclasses of the built-in types and other implementations of the
+    abstract base classes."""
     match obj:
-        case None:
-            yield 'null'
-        # Must check for true, false before number, as boolean is an instance of
-        # Number, and str(obj) would return True/False instead of true/false then
-        case True:
-            yield 'true'
-        case False:
-            yield 'false'
         case _ if isinstance(obj, numbers.Number):
-            yield str(obj)
+            return _encode_number
         # Strings are also Sequences, but we don't want to encode as lists
         case _ if isinstance(obj, str):
-            yield from _escape_string(obj)
+            return _encode_string
         case _ if isinstance(obj, collections.abc.Sequence):
-            yield from _encode_list(obj, separators, indent, level)
+            return _encode_list
         case _ if isinstance(obj, collections.abc.Mapping):
-            yield from _encode_dict(obj, separators, indent, level)
+            return _encode_dict
         case _:
             raise RuntimeError("Unsupported object type")
 
 
+def _format_null(obj: None) -> str:
+    return 'null'
+
+
+def _format_bool(obj: bool) -> str:
+    # Must not be handled as a number, as str(obj) would return True/False
+    # instead of true/false then
+    return 'true' if obj else 'false'
+
+
+def _format_int(obj: int) -> str:
+    return _INT_STRINGS.get(obj) or str(obj)
+
+
+# The scalar encoders inline the matching _format_* function, as they are
+# called for every value and an extra call is noticeable
+def _encode_null(obj: None, out: list[str], *_):
+    out.append('null')
+
+
+def _encode_bool(obj: bool, out: list[str], *_):
+    out.append('true' if obj else 'false')
+
+
+def _encode_int(obj: int, out: list[str], *_):
+    out.append(_INT_STRINGS.get(obj) or str(obj))
+
+
+def _encode_number(obj: numbers.Number, out: list[str], *_):
+    out.append(str(obj))
+
+
+def _encode_string(obj: str, out: list[str], *_):
+    out.append(_escape_string(obj))
+
+
+# Only a handful of distinct indentation levels are used in a document, so
+# cache them instead of building a new string for every line
+@functools.lru_cache(maxsize=64)
 def _indent(level: int, indent: str):
     return indent * level
 
 
-def _encode_key(k: str):
-    yield from _escape_string(k, False)
+# Keys repeat a lot more than values, so remember how each one is written
+@functools.lru_cache(maxsize=1024)
+def _encode_key(k: str) -> str:
+    return _escape_string(k, False)
+
+
+# Below this length, encoding a list element by element is faster than
+# checking the element types and joining
+_JOIN_MIN_LENGTH = 8
 
 
 def _encode_list(
-    obj: typing.Sequence, separators: tuple[str, str, str],
+    obj: typing.Sequence, out: list[str], separators: tuple[str, str, str],
     indent: str, level: int
 ):
-    yield '['
+    # Longer lists of scalars can be joined in one go. The type check has a
+    # fixed cost, so short lists are cheaper to encode element by element.
+    # This is all(type(e) in _SCALAR_FORMATTERS ...) without a Python-level
+    # generator, and stops at the first element of another type
+    if len(obj) >= _JOIN_MIN_LENGTH and all(
+        map(_SCALAR_FORMATTERS.__contains__, map(type, obj))
+    ):
+        out.append('[' + separators[0].join(
+            [_SCALAR_FORMATTERS[type(e)](e) for e in obj]
+        ) + ']')
+        return
+
+    out.append('[')
     first = True
     for element in obj:
         if first:
             first = False
         else:
-            yield separators[0]
-        yield from _encode(element, separators, indent, level + 1)
-    yield ']'
+            out.append(separators[0])
+        _encode(element, out, separators, indent, level + 1)
+    out.append(']')
 
 
 def _encode_dict(
-    obj: typing.Mapping, separators: tuple[str, str, str],
+    obj: typing.Mapping, out: list[str], separators: tuple[str, str, str],
     indent: str, level: int
 ):
     if level > 0:
-        yield '{'
-        yield separators[1]
-    first = True
+        out.append('{' + separators[1])
+    line_indent = _indent(level, indent)
+    # Emit everything up to the value as a single fragment
+    entry_prefix = line_indent
     for key, value in obj.items():
-        if first:
-            first = False
-        else:
-            yield '\n'
-        yield _indent(level, indent)
-        yield from _encode_key(key)
-        yield separators[2]
-        yield from _encode(value, separators, indent, level + 1)
-    yield separators[1]
-    yield _indent(level - 1, indent)
+        out.append(entry_prefix + _encode_key(key) + separators[2])
+        entry_prefix = '\n' + line_indent
+        _encode(value, out, separators, indent, level + 1)
+    out.append(separators[1] + _indent(level - 1, indent))
     if level > 0:
-        yield '}'
+        out.append('}')
+
+
+# Encoders for the built-in types, looked up by exact type. Note that bool must
+# not be encoded as int, which the exact type lookup guarantees
+_ENCODERS = {
+    type(None): _encode_null,
+    bool: _encode_bool,
+    int: _encode_int,
+    float: _encode_number,
+    str: _encode_string,
+    list: _encode_list,
+    tuple: _encode_list,
+    dict: _encode_dict,
+}
+
+
+# String conversions for the scalar types, used to encode lists of scalars.
+# These must produce the same output as the scalar encoders
+_SCALAR_FORMATTERS = {
+    type(None): _format_null,
+    bool: _format_bool,
+    int: _format_int,
+    float: str,
+    str: _escape_string,
+}
@@ -124,6 +124,23 @@ def testEncodeDictLike():
     assert "foo = \"test\"\ntest = 42\n" == r
 
 
+def testEncodeListOfScalars():
+    r = sjson.dumps({'k': [None, True, 1, 1.5, 'a b']})
+    assert 'k = [null, true, 1, 1.5, "a b"]\n' == r
+
+
+def testEncodeLongListOfScalarsMatchesSingleValues():
+    values = [None, True, False, 1, -5, 10**20, 1.5, 'a', 'a b', 'q"']
+    r = sjson.dumps({'k': values})
+    single = [sjson.dumps({'k': v})[4:-1] for v in values]
+    assert 'k = [' + ', '.join(single) + ']\n' == r
+
+
+def testEncodeRepeatedMappingSubclass():
+    r = sjson.dumps({'a': [OrderedDict(x=1), OrderedDict(y=2)]})
+    assert 'a = [{\nx = 1\n}, {\ny = 2\n}]\n' == r
+
+
 def testEncodeNestedDict():
     r = sjson.dumps({'n': OrderedDict([('a', 1), ('b', 2)])})
     assert 'n = {\na = 1\nb = 2\n}\n' == r
@@ -297,6 +314,13 @@ def testExceptionLocationFromBytesIO():
         assert location.column == 7
 
 
+def testExceptionLocationOfInvalidNumber():
+    with pytest.raises(sjson.ParseException) as e:
+        sjson.loads('a = 1.5.3')
+    # The location points at the start of the invalid literal
+    assert e.value.get_location() == (1, 5)
+
+
 def testDecodeFromStream():
     s = """name = "FontTextureGenerator",
 flags = ["UsesOpenMP"]"""
@@ -468,3 +492,34 @@ def testEncodeUnknownTypeRaisesException():
 def testDecodeEscapedCharacters():
     r = sjson.loads('''a = "\\b\\n\\t"''')
     assert r['a'] == """\b\n\t"""
+
+
+def testDecodeFromStreamWithWhitespaceLargerThanBuffer():
+    s = 'a = 1' + ' ' * (io.DEFAULT_BUFFER_SIZE * 2) + '\nb = 2'
+    r = sjson.load(io.BytesIO(s.encode('utf-8')))
+    assert r == {'a': 1, 'b': 2}
+
+
+def testDecodeStringWithMultipleEscapes():
+    r = sjson.loads(r'a = "x\\y\"z\n"')
+    assert r['a'] == 'x\\y"z\n'
+
+
+def testDecodeLuaRawStringWithClosingBrackets():
+    r = sjson.loads('a = [=[ ] ]] ]=]')
+    assert r['a'] == ' ] ]] '
+
+
+def testDecodeEmptyDocument():
+    assert sjson.loads('') == {}
+
+
+def testDecodeEmptyString():
+    assert sjson.loads('a = ""') == {'a': ''}
+
+
+def testEncodeStringWithBackslashRoundTrips():
+    d = {'key': 'C:\\new\\table'}
+    r = sjson.dumps(d)
+    assert r == 'key = "C:\\\\new\\\\table"\n'
+    assert sjson.loads(r) == d